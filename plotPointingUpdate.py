@@ -8,6 +8,7 @@ import scipy.stats
 import sunpy
 import matplotlib.pyplot as plt
 import astropy.io.fits as fits
+import stageTimer
 
 #launch date; used to compute a feature for scans
 launchHinode = datetime.datetime(year=2006,month=9,day=22,hour=21,minute=36,second=0)
@@ -22,6 +23,7 @@ def timeOfYear(date):
     startOfYear = datetime.datetime(year=date.year, month=1, day=1, hour=0, minute=0, second=0)
     return (date-startOfYear).total_seconds() 
 
+@stageTimer.timed("kernelReg")
 def kernelReg(x,y,sigma,xEval):
     """Nadaraya-Watson kernel regression
 
@@ -58,6 +60,7 @@ class LinearPlusLUT:
         self.yOutlierQuantile = yOutlierQuantile
         self.bandwidth = bandwidth
 
+    @stageTimer.timed("LinearPlusLUT.fit")
     def fit(self, XLinear, XLUT, y):
         """Fit the model to predict y using a linear model in XLinear and LUT
             model in XLUT.
@@ -102,6 +105,7 @@ class LinearPlusLUT:
         XLinear1 = np.hstack([XLinear.reshape(-1,1), np.ones((N,1))])
         self.w, _, _, _ = np.linalg.lstsq(XLinear1, LUTResidual,rcond=None)
 
+    @stageTimer.timed("LinearPlusLUT.predict")
     def predict(self, XLinear, XLUT):
         """Predict a model given the linear feature in XLinear and the LUT
         feature in XLUT"""
@@ -141,6 +145,7 @@ class LinearPlusLUT:
             self.XLUT[i-1], self.y[i-1] = float(line[0]), float(line[1])
 
 
+@stageTimer.timed("handle")
 def handle(t):
     """Compute the pointing update and compute variable to correlate against
     Put in a global function to enable multiprocessing"""
@@ -150,15 +155,17 @@ def handle(t):
 
     print(scanI, scan)
 
-    #open the original and upate
-    scanOrig = fits.open(os.path.join(origSrc, scan))
-    scanUpdate = fits.open(os.path.join(updateSrc, scan))
+    #open the original and upate; fits loads lazily, so the reads of the
+    #coordinates are where most of the I/O happens
+    with stageTimer.timeStage("fitsRead"):
+        scanOrig = fits.open(os.path.join(origSrc, scan))
+        scanUpdate = fits.open(os.path.join(updateSrc, scan))
 
-    #the original XCEN and YCEN; we recalculate this since the headers aren't
-    #always quite right since XCEN gets loaded from Level1 in a suboptimal way
-    #in some cases
-    XCENO = np.mean(scanOrig[38].data[:,[0,-1]])
-    YCENO = np.mean(scanOrig[39].data[[0,-1],:])
+        #the original XCEN and YCEN; we recalculate this since the headers
+        #aren't always quite right since XCEN gets loaded from Level1 in a
+        #suboptimal way in some cases
+        XCENO = np.mean(scanOrig[38].data[:,[0,-1]])
+        YCENO = np.mean(scanOrig[39].data[[0,-1],:])
 
     #updated XCEN, YCEN
     XCENU = scanUpdate[0].header['XCEN']
@@ -186,6 +193,12 @@ def handle(t):
     return (dateStr, covariates, pointing)
 
 
+def handleTimed(t):
+    """Run handle and also send back the worker's timing stats so they can be
+    merged in the main process"""
+    return handle(t), stageTimer.collectStats()
+
+
 
 if __name__ == "__main__":
     #
@@ -238,9 +251,17 @@ if __name__ == "__main__":
     pointing = []
 
     #Do this in multiprocessing; turn this up or down depending on your system
-    P = multiprocessing.Pool(12)
-    results = P.map(handle, toHandle)
+    P = multiprocessing.Pool(12, initializer=stageTimer.resetStats)
+    if stageTimer.profileTarget is None:
+        results = P.map(handle, toHandle)
+    else:
+        results = []
+        for result, stats in P.map(handleTimed, toHandle):
+            results.append(result)
+            stageTimer.mergeStats(stats)
     P.close()
+    #wait for the workers so their memory use shows up in the timing stats
+    P.join()
 
     #stack the results into one numpy array
     dateStrs = [t[0] for t in results]
@@ -0,0 +1,220 @@
+"""
+Lightweight timing for the stages of the scripts (FITS I/O, fitting, warping,
+etc.). Everything here is a no-op unless the SOTSP_PROFILE environment
+variable is set to the path of a JSON file, e.g.,
+
+    SOTSP_PROFILE=timing.json python plotPointingUpdate.py savetable
+
+The JSON file contains per-stage total time (seconds) and call counts, as well
+as the peak resident memory of the process and of its largest child (only
+children that have exited and been waited for count, so join any pool before
+dumping). Setting SOTSP_PROFILE_STAGE to the name of one stage additionally
+captures a cProfile of just that stage, saved next to the JSON file as
+<name>.<stage>.prof (view it with python -m pstats or snakeviz). A warning is
+printed if that stage never ran. The stats are written when the script exits,
+including on sys.exit or an uncaught exception.
+
+Some care is needed reading totalSeconds:
+- Totals are inclusive: a stage's time includes any stages run inside it
+  (e.g., LinearPlusLUT.fit includes its kernelReg calls, and handle includes
+  fitsRead), so stages shouldn't be added together.
+- A stage that is re-entered inside itself is only counted once, at the
+  outermost level.
+- Time from multiprocessing workers is summed across all of them, so stages
+  run in a pool can add up to far more than the wall-clock time of the run.
+"""
+import os
+import sys
+import time
+import json
+import cProfile
+import pstats
+import functools
+import contextlib
+import atexit
+import multiprocessing
+
+try:
+    import resource
+except ImportError:
+    #not available on windows; we just don't report memory there
+    resource = None
+
+#where to dump the stats; None means profiling is off
+profileTarget = os.environ.get("SOTSP_PROFILE") or None
+
+#which single stage, if any, to run cProfile on
+profileStage = os.environ.get("SOTSP_PROFILE_STAGE") or None
+
+#stage name -> [number of calls, total seconds]
+_stages = {}
+
+#stage name -> how many times we're currently nested inside that stage
+_active = {}
+
+#the cProfile for profileStage
+_profiler = None
+
+#raw cProfile stats collected from other processes (see mergeStats)
+_profileStatsMerged = []
+
+
+class _RawStats:
+    """Wrapper so that pstats.Stats can load an already-collected stats dict"""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+@contextlib.contextmanager
+def timeStage(name):
+    """Context manager that adds the time spent inside it to stage name"""
+    global _profiler
+
+    if profileTarget is None:
+        yield
+        return
+
+    #if we're already inside this stage, the outer call accounts for the time
+    if _active.get(name, 0) > 0:
+        _active[name] += 1
+        try:
+            yield
+        finally:
+            _active[name] -= 1
+        return
+
+    profiling = name == profileStage
+    if profiling:
+        if _profiler is None:
+            _profiler = cProfile.Profile()
+        _profiler.enable()
+
+    _active[name] = 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _active[name] = 0
+
+        if profiling:
+            _profiler.disable()
+
+        entry = _stages.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed
+
+
+def timed(name):
+    """Decorator version of timeStage; the function is returned untouched if
+    profiling is off so there's no overhead"""
+    def decorator(func):
+        if profileTarget is None:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timeStage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def resetStats():
+    """Forget everything gathered so far in this process. Use this as the
+    initializer for multiprocessing pools so forked workers don't send back
+    stats they inherited from the parent"""
+    global _profiler, _stages
+
+    _stages = {}
+    _profiler = None
+    _active.clear()
+    del _profileStatsMerged[:]
+
+
+def collectStats():
+    """Return (and reset) the stats gathered in this process. This is meant to
+    be sent back from multiprocessing workers and passed to mergeStats"""
+    global _profiler, _stages
+
+    profileStats = None
+    if _profiler is not None:
+        _profiler.create_stats()
+        profileStats = _profiler.stats
+        _profiler = None
+
+    stats = {"stages": _stages, "profile": profileStats}
+    _stages = {}
+    return stats
+
+
+def mergeStats(stats):
+    """Add stats from collectStats (e.g., from a worker) into this process"""
+    for name, (calls, seconds) in stats["stages"].items():
+        entry = _stages.setdefault(name, [0, 0.0])
+        entry[0] += calls
+        entry[1] += seconds
+
+    if stats["profile"] is not None:
+        _profileStatsMerged.append(stats["profile"])
+
+
+def peakRSS():
+    """Return the peak resident set size in kB of (this process, its largest
+    child that has been waited for), or (None, None) if it's not available"""
+    if resource is None:
+        return None, None
+
+    selfRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    childRSS = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+    #linux reports kB, mac reports bytes
+    if sys.platform == "darwin":
+        selfRSS, childRSS = selfRSS // 1024, childRSS // 1024
+    return selfRSS, childRSS
+
+
+def dumpStats():
+    """Write the stats to profileTarget (and the cProfile of profileStage, if
+    any was captured). Does nothing if profiling is off. This is run
+    automatically when the script exits"""
+    if profileTarget is None:
+        return
+
+    #fold this process's stats in alongside any from workers
+    mergeStats(collectStats())
+
+    selfRSS, childRSS = peakRSS()
+    out = {
+        "stages": {name: {"calls": calls, "totalSeconds": seconds}
+                   for name, (calls, seconds) in sorted(_stages.items())},
+        "peakRSSKB": selfRSS,
+        "peakRSSChildrenKB": childRSS,
+    }
+
+    with open(profileTarget, "w") as fh:
+        json.dump(out, fh, indent=2)
+
+    if len(_profileStatsMerged) > 0:
+        allStats = pstats.Stats(_RawStats(_profileStatsMerged[0]))
+        for stats in _profileStatsMerged[1:]:
+            allStats.add(_RawStats(stats))
+        base = os.path.splitext(profileTarget)[0]
+        allStats.dump_stats("%s.%s.prof" % (base, profileStage))
+    elif profileStage is not None:
+        print("Warning: SOTSP_PROFILE_STAGE=%s never ran; no profile saved" % profileStage)
+
+
+def _dumpStatsAtExit():
+    """Dump the stats at exit, but only from the main process; spawned
+    multiprocessing workers also run atexit handlers and shouldn't write"""
+    if multiprocessing.parent_process() is None:
+        dumpStats()
+
+
+if profileTarget is not None:
+    atexit.register(_dumpStatsAtExit)
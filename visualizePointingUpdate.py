@@ -7,6 +7,7 @@ import scipy.ndimage as ndimage
 import os
 import sys
 import pdb
+import stageTimer
 
 def slitToPixLocation(slitpos):
     """Given the slit position from SOT/SP, return the actual position
@@ -33,6 +34,7 @@ def slitDrop(X, slitpos):
     actualPixLocation = slitToPixLocation(slitpos)
     return np.hstack([X[:,[int(i)]] for i in actualPixLocation])
 
+@stageTimer.timed("slitInterp")
 def slitInterp(X, slitpos, mode="linear"):
     """Given an image where the columns indicate slit indices, expand it so that
     the columns indicate slit positions. Makes the image bigger, or 
@@ -81,11 +83,13 @@ if __name__ == "__main__":
     if not os.path.exists(target):
         os.mkdir(target)
 
-    update = fits.open(os.path.join(srcUpdate, fn))
+    with stageTimer.timeStage("fitsRead"):
+        update = fits.open(os.path.join(srcUpdate, fn))
     print("\nStart Header information")
     print(repr(update[0].header))
     print("End header information\n")
-    prev = fits.open(os.path.join(srcPrev, fn))
+    with stageTimer.timeStage("fitsRead"):
+        prev = fits.open(os.path.join(srcPrev, fn))
 
     #There are three "coordinate systems":
     #HMI: the original HMI grid
@@ -94,13 +98,16 @@ if __name__ == "__main__":
     #SP: the SP data, where columns are indices, not positions. This is how
     #   SOTSP is stored, but not how it should be used.
 
-    #Old X/Y Coordinates
-    SP_XOLD = prev[38].data
-    SP_YOLD = prev[39].data
+    #fits memory-maps the data; copying it with np.array forces the actual
+    #read from disk to happen here, so it's timed as fitsRead
+    with stageTimer.timeStage("fitsRead"):
+        #Old X/Y Coordinates
+        SP_XOLD = np.array(prev[38].data)
+        SP_YOLD = np.array(prev[39].data)
 
-    #Updated X/Y Coordinates
-    SP_XNEW = update[38].data
-    SP_YNEW = update[39].data
+        #Updated X/Y Coordinates
+        SP_XNEW = np.array(update[38].data)
+        SP_YNEW = np.array(update[39].data)
 
 
     # For many applications, the above's the only part needed. However, if you 
@@ -112,9 +119,10 @@ if __name__ == "__main__":
     pointYMax = max(np.nanmax(SP_YOLD), np.nanmax(SP_YNEW))
 
     #load the field data; expand it to make it an image
-    SLITPOS = prev[41].data
+    with stageTimer.timeStage("fitsRead"):
+        SLITPOS = np.array(prev[41].data)
 
-    SP_Field = prev[1].data
+        SP_Field = np.array(prev[1].data)
     SPEXPAND_Field = slitInterp(SP_Field, SLITPOS)
 
     
@@ -126,6 +134,7 @@ if __name__ == "__main__":
         ])
 
     #do a warping from HMI to the SPEXPAND coordinate system
+    @stageTimer.timed("fromHMItoSPEXPAND")
     def fromHMItoSPEXPAND(X):
         return ndimage.affine_transform(denanify(X), affineXYToYX(affXform), 
                 output_shape=SPEXPAND_Field.shape, order=1)
@@ -154,16 +163,18 @@ if __name__ == "__main__":
         print("  http://jsoc.stanford.edu/ajax/exportdata.html")
         sys.exit(1)
 
-    HMIFieldMap = sunpy.map.Map(hmiFieldName)
-    HMI_HMIField = HMIFieldMap.data[::-1,::-1]
+    with stageTimer.timeStage("hmiRead"):
+        HMIFieldMap = sunpy.map.Map(hmiFieldName)
+        HMI_HMIField = HMIFieldMap.data[::-1,::-1]
 
     #get the arcsec info per-pixel, flipping to account for the fact that
     #the transformation is from the flipped HMI system
-    H, W = HMIFieldMap.data.shape[0], HMIFieldMap.data.shape[1]
-    HMIX, HMIY = np.meshgrid(np.array(range(W)), np.array(range(H)))
-    sc = HMIFieldMap.pixel_to_world(HMIX*u.pix, HMIY*u.pix)
-    HMI_Tx = sc.Tx.arcsec[::-1,::-1]
-    HMI_Ty = sc.Ty.arcsec[::-1,::-1]
+    with stageTimer.timeStage("hmiPixelToWorld"):
+        H, W = HMIFieldMap.data.shape[0], HMIFieldMap.data.shape[1]
+        HMIX, HMIY = np.meshgrid(np.array(range(W)), np.array(range(H)))
+        sc = HMIFieldMap.pixel_to_world(HMIX*u.pix, HMIY*u.pix)
+        HMI_Tx = sc.Tx.arcsec[::-1,::-1]
+        HMI_Ty = sc.Ty.arcsec[::-1,::-1]
 
     #warp them to the SP Expanded coordinate system
     #Note that *all* affine transformations refer to a map from HMI (flipped)